@@ -1,25 +1,58 @@
+import asyncio
 import json
+from collections import deque
 from datetime import datetime
-from typing import Dict
+from typing import Dict, Optional
 
 class FeedbackSystem:
-    def __init__(self):
-        self.feedback_data = []
-    
-    async def process_feedback(self, question_id: str, feedback_type: str, 
-                             user_comment: str, question_data: Dict) -> Dict:
-        """Process user feedback"""
+    def __init__(self, log_path: str = "feedback.jsonl", max_entries: int = 1000):
+        # Bounded in-memory window of recent feedback; the full stream is
+        # flushed to disk by the write-behind task
+        self.feedback_data = deque(maxlen=max_entries)
+        self.feedback_count = 0
+        self.log_path = log_path
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._writer_task: Optional[asyncio.Task] = None
+
+    async def process_feedback(self, question_id: str, feedback_type: str,
+                             user_comment: str, question_data: Dict,
+                             timestamp: Optional[str] = None) -> Dict:
+        """Process user feedback
+
+        Callers that already read the clock for the request can pass the
+        ISO timestamp in to avoid a second clock read here.
+        """
         feedback_entry = {
             "question_id": question_id,
             "feedback_type": feedback_type,
             "user_comment": user_comment,
-            "timestamp": datetime.now().isoformat(),
+            "timestamp": timestamp or datetime.now().isoformat(),
             "question_data": question_data
         }
-        
+
         self.feedback_data.append(feedback_entry)
-        
+        self.feedback_count += 1
+
+        # Hand off to the background writer so disk I/O stays off the
+        # request path
+        if self._writer_task is None:
+            self._writer_task = asyncio.create_task(self._writer())
+        await self._queue.put(feedback_entry)
+
         # Log feedback for analysis
         print(f"Feedback received: {feedback_type} for question {question_id}")
-        
-        return {"status": "processed", "feedback_id": len(self.feedback_data)}
\ No newline at end of file
+
+        return {"status": "processed", "feedback_id": self.feedback_count}
+
+    async def _writer(self):
+        """Flush queued feedback entries to disk in batches"""
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty() and len(batch) < 256:
+                batch.append(self._queue.get_nowait())
+            lines = "\n".join(json.dumps(entry) for entry in batch) + "\n"
+            await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str):
+        with open(self.log_path, "a") as f:
+            f.write(lines)
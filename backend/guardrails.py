@@ -1,58 +1,96 @@
 import re
+from dataclasses import dataclass
 from typing import List
 
+@dataclass(frozen=True)
+class QuestionFeatures:
+    """Derived views of a question, computed once and shared down the
+    pipeline so guardrails, routing and retrieval don't each re-scan
+    and re-lowercase the same string"""
+    raw: str
+    lower: str
+
+def featurize(question: str) -> QuestionFeatures:
+    """Build QuestionFeatures for a raw question string"""
+    return QuestionFeatures(raw=question, lower=question.lower())
+
 class InputGuardrails:
     def __init__(self):
         self.blocked_patterns = [
-            r"(?i)(hack|exploit|malware|virus)",
-            r"(?i)(personal\s+information|private\s+data|social\s+security)",
-            r"(?i)(violent|harmful|illegal|dangerous)",
-            r"(?i)(password|credit\s+card|bank\s+account)"
+            r"(?:hack|exploit|malware|virus)",
+            r"(?:personal\s+information|private\s+data|social\s+security)",
+            r"(?:violent|harmful|illegal|dangerous)",
+            r"(?:password|credit\s+card|bank\s+account)"
         ]
-        self.math_keywords = [
+        self.math_keywords = frozenset({
             "equation", "derivative", "integral", "theorem", "proof",
             "calculation", "formula", "solve", "compute", "mathematics",
             "algebra", "geometry", "calculus", "statistics", "probability",
             "function", "limit", "matrix", "vector", "graph", "number",
             "polynomial", "logarithm", "exponential", "trigonometry"
-        ]
-    
+        })
+        self.question_words = frozenset({
+            "what", "how", "why", "where", "when",
+            "explain", "solve", "find", "calculate"
+        })
+        # The blocklist keeps its own compiled scan: folded into the fused
+        # alternation below, an allow-signal match could consume past the
+        # start of a blocked term, which finditer (non-overlapping) would
+        # then never report
+        self.blocked_re = re.compile("|".join(self.blocked_patterns), re.IGNORECASE)
+        # Fuse the allow-signals into one multi-pattern scan: math
+        # keywords, question words, digits and math symbols in one pass
+        self.scan_re = re.compile(
+            "(?P<math>" + "|".join(sorted(self.math_keywords)) + ")"
+            "|(?P<qword>" + "|".join(sorted(self.question_words)) + ")"
+            r"|(?P<signal>\d|[+\-*/=^()√∑∫])",
+            re.IGNORECASE
+        )
+
     def validate(self, question: str) -> bool:
         """Validate input question"""
-        if not question or len(question.strip()) < 3:
+        return self.validate_features(featurize(question))
+
+    def validate_features(self, features: QuestionFeatures) -> bool:
+        """Validate a question from its precomputed features"""
+        if not features.raw or len(features.raw.strip()) < 3:
+            return False
+
+        if self.blocked_re.search(features.lower):
             return False
-            
-        # Check for blocked content
-        for pattern in self.blocked_patterns:
-            if re.search(pattern, question):
-                return False
-        
-        # Check if it's math-related
-        question_lower = question.lower()
-        has_math_content = any(keyword in question_lower for keyword in self.math_keywords)
-        has_numbers = bool(re.search(r'\d', question))
-        has_math_symbols = bool(re.search(r'[+\-*/=^()√∑∫]', question))
-        has_question_words = any(word in question_lower for word in ['what', 'how', 'why', 'where', 'when', 'explain', 'solve', 'find', 'calculate'])
-        
-        return has_math_content or has_numbers or has_math_symbols or has_question_words
+
+        # Any allow-signal hit makes the question mathematical enough
+        return self.scan_re.search(features.lower) is not None
 
 class OutputGuardrails:
     def __init__(self):
         self.blocked_outputs = [
             "I cannot", "I'm unable", "I don't know", "I can't help"
         ]
-    
+        # One compiled alternation replaces a substring scan per phrase
+        self.blocked_re = re.compile("|".join(re.escape(s) for s in self.blocked_outputs))
+        # Answers carrying either prefix are already formatted
+        self.known_prefixes = ("**Step-by-step", "**Educational")
+        # Matches iff the whitespace-trimmed answer spans >= 10 characters,
+        # without the full-string copy len(answer.strip()) would make
+        self.min_content_re = re.compile(r"\S[\s\S]{8,}\S")
+
     def validate(self, answer: str) -> str:
         """Validate and clean output"""
-        if not answer or len(answer.strip()) < 10:
+        if not answer or not self.min_content_re.search(answer):
             return "I apologize, but I couldn't generate a comprehensive answer. Please try rephrasing your question."
-        
+
+        # Collect the pieces and join once at the end, so the (potentially
+        # long) answer body is copied a single time instead of per tweak
+        parts = []
+
         # Ensure educational format
-        if not answer.startswith("**Step-by-step"):
-            answer = "**Educational Mathematical Response:**\n\n" + answer
-        
+        if not answer.startswith(self.known_prefixes):
+            parts.append("**Educational Mathematical Response:**\n\n")
+        parts.append(answer)
+
         # Add educational disclaimer if needed
-        if any(blocked in answer for blocked in self.blocked_outputs):
-            answer += "\n\n**Note:** This is an educational mathematics system. Please ensure your question is related to mathematical concepts."
-        
-        return answer
\ No newline at end of file
+        if self.blocked_re.search(answer):
+            parts.append("\n\n**Note:** This is an educational mathematics system. Please ensure your question is related to mathematical concepts.")
+
+        return answer if len(parts) == 1 else "".join(parts)
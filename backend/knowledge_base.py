@@ -1,5 +1,7 @@
+import asyncio
 import chromadb
 import logging
+import numpy as np
 import os
 from typing import List, Dict, Optional
 from datetime import datetime
@@ -7,42 +9,21 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-class KnowledgeBase:
-    def __init__(self):
-        self.client = None
-        self.collection = None
-        self.collection_name = "math_knowledge_base"
-        self.logger = logging.getLogger(__name__)
-        
-    async def initialize(self):
-        """Initialize the knowledge base with ChromaDB"""
-        try:
-            # Initialize ChromaDB client (uses default embeddings)
-            self.client = chromadb.PersistentClient(path="./chroma_db")
-            
-            # Create or get collection
-            self.collection = self.client.get_or_create_collection(
-                name=self.collection_name,
-                metadata={"description": "Mathematical knowledge base"}
-            )
-            
-            # Load initial data if collection is empty
-            if self.collection.count() == 0:
-                await self.load_initial_data()
-            
-            self.logger.info("Knowledge base initialized successfully")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to initialize knowledge base: {str(e)}")
-            # Don't raise error to allow app to start
-    
-    async def load_initial_data(self):
-        """Load initial mathematical knowledge data"""
-        initial_data = [
-            {
-                "id": "calc_derivative_1",
-                "question": "What is the derivative of x²?",
-                "answer": """**Step-by-step solution:**
+def _chunks(seq, n):
+    """Yield successive n-sized slices of a sequence"""
+    for i in range(0, len(seq), n):
+        yield seq[i:i + n]
+
+# Seed corpus stored column-wise (ids / documents / metadatas) so startup
+# ingestion passes the columns straight to ChromaDB with no transposition
+_SEED_IDS = (
+    "calc_derivative_1",
+    "algebra_quadratic_1",
+    "geometry_pythagorean_1",
+)
+
+_SEED_DOCS = (
+    """**Step-by-step solution:**
 
 1. **Identify the function:** f(x) = x²
 2. **Apply the power rule:** For f(x) = xⁿ, f'(x) = n·xⁿ⁻¹
@@ -50,13 +31,7 @@ class KnowledgeBase:
 4. **Verify:** The derivative of x² is 2x
 
 **Key concept:** The power rule is fundamental in calculus for finding derivatives of polynomial functions.""",
-                "topic": "calculus",
-                "difficulty": "basic"
-            },
-            {
-                "id": "algebra_quadratic_1",
-                "question": "How do you solve a quadratic equation?",
-                "answer": """**Step-by-step solution for ax² + bx + c = 0:**
+    """**Step-by-step solution for ax² + bx + c = 0:**
 
 1. **Identify coefficients:** a, b, and c
 2. **Apply quadratic formula:** x = (-b ± √(b² - 4ac)) / (2a)
@@ -70,13 +45,7 @@ class KnowledgeBase:
 - a = 1, b = -5, c = 6
 - x = (5 ± √(25 - 24)) / 2 = (5 ± 1) / 2
 - Solutions: x = 3 or x = 2""",
-                "topic": "algebra",
-                "difficulty": "intermediate"
-            },
-            {
-                "id": "geometry_pythagorean_1",
-                "question": "What is the Pythagorean theorem?",
-                "answer": """**The Pythagorean Theorem:**
+    """**The Pythagorean Theorem:**
 
 1. **Statement:** In a right triangle, a² + b² = c²
 2. **Where:**
@@ -93,17 +62,93 @@ class KnowledgeBase:
 - 3² + 4² = c²
 - 9 + 16 = c²
 - c = √25 = 5 units""",
-                "topic": "geometry",
-                "difficulty": "basic"
-            }
-        ]
+)
+
+_SEED_METAS = (
+    {"question": "What is the derivative of x²?", "topic": "calculus", "difficulty": "basic"},
+    {"question": "How do you solve a quadratic equation?", "topic": "algebra", "difficulty": "intermediate"},
+    {"question": "What is the Pythagorean theorem?", "topic": "geometry", "difficulty": "basic"},
+)
+
+class KnowledgeBase:
+    def __init__(self):
+        self.client = None
+        self.collection = None
+        self.collection_name = "math_knowledge_base"
+        self.logger = logging.getLogger(__name__)
+        # Semantic cache: normalized question embeddings live in one
+        # preallocated float32 matrix (ring buffer) with a parallel list of
+        # results, so a lookup is a single matrix-vector product. float32
+        # keeps the gemv on BLAS (NumPy has no fp16 kernel and would fall
+        # back to loops) and the full matrix is only ~1.5 MB
+        self.embedder = None
+        self.cache_capacity = 1024
+        self.cache_threshold = 0.95
+        self.cache_keys = None
+        self.cache_values: List[Optional[Dict]] = []
+        self.cache_size = 0
+        self.cache_cursor = 0
+        # For small corpora, retrieval bypasses ChromaDB entirely: all
+        # document embeddings are held in one normalized matrix and the
+        # best match is a single matrix-vector product
+        self.fast_path_limit = 10000
+        self.doc_matrix = None
+        self.doc_texts: List[str] = []
+        self.doc_metadatas: List[Dict] = []
         
-        # Add data to ChromaDB (uses default embeddings)
+    async def initialize(self):
+        """Initialize the knowledge base with ChromaDB"""
+        try:
+            # Initialize ChromaDB client (uses default embeddings)
+            self.client = chromadb.PersistentClient(path="./chroma_db")
+            
+            # Create or get collection. Cosine space matches the normalized
+            # embeddings used everywhere else; the HNSW parameters trade a
+            # little build time for less index churn during bulk ingestion
+            self.collection = self.client.get_or_create_collection(
+                name=self.collection_name,
+                metadata={
+                    "description": "Mathematical knowledge base",
+                    "hnsw:space": "cosine",
+                    "hnsw:construction_ef": 100,
+                    "hnsw:M": 16,
+                    "hnsw:search_ef": 64
+                }
+            )
+            
+            # Embedder for the semantic cache (same model ChromaDB uses)
+            from chromadb.utils import embedding_functions
+            self.embedder = embedding_functions.DefaultEmbeddingFunction()
+
+            # Load initial data if collection is empty
+            if await asyncio.to_thread(self.collection.count) == 0:
+                await self.load_initial_data()
+
+            await asyncio.to_thread(self._build_fast_path)
+
+            self.logger.info("Knowledge base initialized successfully")
+            
+        except Exception as e:
+            self.logger.error("Failed to initialize knowledge base: %s", e)
+            # Don't raise error to allow app to start
+    
+    async def load_initial_data(self):
+        """Load initial mathematical knowledge data"""
+        await self.add_columns(list(_SEED_DOCS), list(_SEED_METAS), list(_SEED_IDS))
+
+    async def add_many(self, items: List[Dict], batch_size: int = 200):
+        """Add documents to the knowledge base in batches
+
+        Each item needs "id", "question", "answer", "topic" and "difficulty"
+        keys. Items are inserted in batch_size slabs so large ingestions pay
+        one ChromaDB transaction per slab instead of one per document;
+        100-250 is the sweet spot for batch_size.
+        """
         documents = []
         metadatas = []
         ids = []
-        
-        for item in initial_data:
+
+        for item in items:
             documents.append(item["answer"])
             metadatas.append({
                 "question": item["question"],
@@ -111,18 +156,97 @@ class KnowledgeBase:
                 "difficulty": item["difficulty"]
             })
             ids.append(item["id"])
-        
+
+        await self.add_columns(documents, metadatas, ids, batch_size)
+
+    async def add_columns(self, documents: List[str], metadatas: List[Dict],
+                          ids: List[str], batch_size: int = 200):
+        """Add pre-transposed document columns to the knowledge base
+
+        Callers that already hold parallel documents/metadatas/ids lists
+        (like the seed corpus) skip the row-to-column transposition that
+        add_many performs.
+        """
         try:
             # Use ChromaDB's default embedding function
-            self.collection.add(
-                documents=documents,
-                metadatas=metadatas,
-                ids=ids
-            )
-            self.logger.info(f"Loaded {len(initial_data)} documents into knowledge base")
+            for doc_batch, meta_batch, id_batch in zip(
+                _chunks(documents, batch_size),
+                _chunks(metadatas, batch_size),
+                _chunks(ids, batch_size)
+            ):
+                await asyncio.to_thread(
+                    self.collection.add,
+                    documents=doc_batch,
+                    metadatas=meta_batch,
+                    ids=id_batch
+                )
+            self.logger.info("Loaded %d documents into knowledge base", len(ids))
+            # Keep the in-memory fast path in sync with the collection
+            await asyncio.to_thread(self._build_fast_path)
         except Exception as e:
-            self.logger.error(f"Error loading initial data: {str(e)}")
+            self.logger.error("Error adding documents: %s", e)
     
+    def _build_fast_path(self):
+        """Load the corpus into an in-memory embedding matrix if it's small
+
+        For corpora under fast_path_limit documents, one L2-normalized
+        float32 matrix turns retrieval into a matmul plus argmax, which is
+        far cheaper than the HNSW-plus-SQLite round-trip per query.
+        """
+        try:
+            if self.collection.count() >= self.fast_path_limit:
+                self.doc_matrix = None
+                return
+            data = self.collection.get(include=["documents", "metadatas", "embeddings"])
+            embeddings = np.asarray(data["embeddings"], dtype=np.float32)
+            if embeddings.size == 0:
+                self.doc_matrix = None
+                return
+            norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            self.doc_matrix = embeddings / norms
+            self.doc_texts = data["documents"]
+            self.doc_metadatas = data["metadatas"] or [{}] * len(self.doc_texts)
+        except Exception as e:
+            self.logger.error("Error building in-memory index: %s", e)
+            self.doc_matrix = None
+
+    def _embed(self, question: str) -> Optional[np.ndarray]:
+        """Embed and L2-normalize a question, or None if unavailable"""
+        if not self.embedder:
+            return None
+        try:
+            emb = np.asarray(self.embedder([question])[0], dtype=np.float32)
+            norm = np.linalg.norm(emb)
+            return emb / norm if norm > 0 else None
+        except Exception as e:
+            self.logger.error("Error embedding question: %s", e)
+            return None
+
+    def _cache_lookup(self, q_emb: np.ndarray) -> Optional[Dict]:
+        """Return the cached result closest to q_emb if similar enough"""
+        if self.cache_size == 0:
+            return None
+        # Keys and q_emb are normalized, so one gemv over the occupied
+        # rows yields every cosine similarity at once
+        scores = self.cache_keys[:self.cache_size] @ q_emb
+        best = int(scores.argmax())
+        if float(scores[best]) >= self.cache_threshold:
+            return self.cache_values[best]
+        return None
+
+    def _cache_store(self, q_emb: np.ndarray, result: Dict):
+        """Insert a result into the semantic cache, evicting the oldest"""
+        if self.cache_keys is None:
+            self.cache_keys = np.zeros(
+                (self.cache_capacity, q_emb.shape[0]), dtype=np.float32
+            )
+            self.cache_values = [None] * self.cache_capacity
+        self.cache_keys[self.cache_cursor] = q_emb
+        self.cache_values[self.cache_cursor] = result
+        self.cache_cursor = (self.cache_cursor + 1) % self.cache_capacity
+        self.cache_size = min(self.cache_size + 1, self.cache_capacity)
+
     async def get_answer(self, question: str) -> Dict:
         """Retrieve answer from knowledge base"""
         try:
@@ -133,20 +257,46 @@ class KnowledgeBase:
                     "sources": [],
                     "metadata": {}
                 }
-            
+
+            # Semantic cache: skip the vector-DB round-trip when a
+            # near-identical question was answered recently. Embedding and
+            # querying both block, so run them off the event loop
+            q_emb = await asyncio.to_thread(self._embed, question)
+            if q_emb is not None:
+                cached = self._cache_lookup(q_emb)
+                if cached is not None:
+                    return cached
+
+                # Small corpus: answer straight from the in-memory matrix
+                if self.doc_matrix is not None:
+                    scores = self.doc_matrix @ q_emb
+                    best = int(scores.argmax())
+                    result = {
+                        "answer": self.doc_texts[best],
+                        "confidence": 0.9,
+                        "sources": ["Knowledge Base (ChromaDB)"],
+                        "metadata": self.doc_metadatas[best] or {}
+                    }
+                    self._cache_store(q_emb, result)
+                    return result
+
             # Search in ChromaDB
-            results = self.collection.query(
+            results = await asyncio.to_thread(
+                self.collection.query,
                 query_texts=[question],
                 n_results=1
             )
-            
+
             if results["documents"] and len(results["documents"][0]) > 0:
-                return {
+                result = {
                     "answer": results["documents"][0][0],
                     "confidence": 0.9,
                     "sources": ["Knowledge Base (ChromaDB)"],
                     "metadata": results["metadatas"][0][0] if results["metadatas"] else {}
                 }
+                if q_emb is not None:
+                    self._cache_store(q_emb, result)
+                return result
             else:
                 return {
                     "answer": "No relevant information found in knowledge base",
@@ -156,7 +306,7 @@ class KnowledgeBase:
                 }
                 
         except Exception as e:
-            self.logger.error(f"Error retrieving from knowledge base: {str(e)}")
+            self.logger.error("Error retrieving from knowledge base: %s", e)
             return {
                 "answer": f"Error accessing knowledge base: {str(e)}",
                 "confidence": 0.0,
@@ -177,7 +327,7 @@ class KnowledgeBase:
             if not self.collection:
                 return {"error": "Knowledge base not initialized"}
             
-            count = self.collection.count()
+            count = await asyncio.to_thread(self.collection.count)
             return {
                 "total_documents": count,
                 "status": "healthy" if count > 0 else "empty",
@@ -1,12 +1,20 @@
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, Field, ValidationError
 from typing import Optional, List, Dict
+import asyncio
+import itertools
 import os
+import re
+import time
 import logging
+from collections import OrderedDict
 from datetime import datetime
 from dotenv import load_dotenv
 
+from guardrails import InputGuardrails, OutputGuardrails, QuestionFeatures, featurize
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -14,7 +22,8 @@ logger = logging.getLogger(__name__)
 app = FastAPI(
     title="Math Routing Agent",
     description="Agentic-RAG Mathematical Professor System",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 app.add_middleware(
@@ -38,6 +47,14 @@ class QuestionResponse(BaseModel):
     timestamp: datetime
     question_id: str
 
+class BatchQuestionRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=20)
+
+class BatchAnswerItem(BaseModel):
+    question: str
+    response: Optional[QuestionResponse] = None
+    error: Optional[str] = None
+
 class FeedbackRequest(BaseModel):
     question_id: str
     feedback_type: str
@@ -62,24 +79,60 @@ KNOWLEDGE_BASE = {
 2. **Example:** If legs are 3 and 4 units: c = √(3² + 4²) = √25 = 5 units"""
 }
 
-question_responses = {}
+# Bounded so the per-request bookkeeping can't grow without limit
+MAX_TRACKED_RESPONSES = 1000
+question_responses = OrderedDict()
 
-def route_question(question: str) -> str:
-    question_lower = question.lower()
-    kb_keywords = ["derivative", "quadratic", "pythagorean", "theorem", "solve"]
-    web_keywords = ["latest", "recent", "current", "research"]
-    
-    kb_score = sum(1 for k in kb_keywords if k in question_lower)
-    web_score = sum(1 for k in web_keywords if k in question_lower)
-    
+# Process-wide sequence makes question ids unique even when several
+# requests land in the same second
+_QUESTION_SEQ = itertools.count()
+
+input_guardrails = InputGuardrails()
+output_guardrails = OutputGuardrails()
+
+# Compiled once at import: a single tagged scan replaces per-request
+# substring checks over the keyword lists and knowledge-base keys
+ROUTE_RE = re.compile(
+    "(?P<kb>derivative|quadratic|pythagorean|theorem|solve)"
+    "|(?P<web>latest|recent|current|research)"
+)
+KB_KEY_RE = re.compile("|".join(KNOWLEDGE_BASE))
+
+# Static endpoint payloads, built once at import instead of per call
+ROOT_INFO = {"message": "Math Routing Agent API", "status": "active", "version": "1.0.0"}
+SAMPLE_QUESTIONS = {
+    "knowledge_base_questions": [
+        "What is the derivative of x²?",
+        "How do you solve a quadratic equation?",
+        "What is the Pythagorean theorem?"
+    ],
+    "web_search_questions": [
+        "Latest developments in quantum computing mathematics",
+        "Recent mathematical proofs in number theory",
+        "Modern applications of calculus in AI"
+    ]
+}
+
+def score_routes(features: QuestionFeatures) -> tuple:
+    kb_hits = set()
+    web_hits = set()
+    for match in ROUTE_RE.finditer(features.lower):
+        if match.lastgroup == "kb":
+            kb_hits.add(match.group())
+        else:
+            web_hits.add(match.group())
+
+    return len(kb_hits), len(web_hits)
+
+def route_question(features: QuestionFeatures) -> str:
+    kb_score, web_score = score_routes(features)
     return "knowledge_base" if kb_score >= web_score else "web_search"
 
-def get_kb_answer(question: str) -> Dict:
-    question_lower = question.lower()
-    for key, answer in KNOWLEDGE_BASE.items():
-        if key in question_lower:
-            return {"answer": answer, "confidence": 0.9, "sources": ["Knowledge Base"]}
-    
+def get_kb_answer(features: QuestionFeatures) -> Dict:
+    match = KB_KEY_RE.search(features.lower)
+    if match:
+        return {"answer": KNOWLEDGE_BASE[match.group()], "confidence": 0.9, "sources": ["Knowledge Base"]}
+
     return {
         "answer": "This is a mathematical question processed by our knowledge base. Please try more specific terms like 'derivative', 'quadratic', or 'pythagorean'.",
         "confidence": 0.5,
@@ -104,7 +157,7 @@ Based on current mathematical research and academic sources, this topic involves
 
 @app.get("/")
 async def root():
-    return {"message": "Math Routing Agent API", "status": "active", "version": "1.0.0"}
+    return ROOT_INFO
 
 @app.get("/health")
 async def health_check():
@@ -117,47 +170,88 @@ async def health_check():
 @app.post("/ask", response_model=QuestionResponse)
 async def ask_question(request: QuestionRequest):
     try:
-        route = route_question(request.question)
-        
-        if route == "knowledge_base":
-            answer_data = get_kb_answer(request.question)
+        # Lowercase and tokenize once; guardrails, routing and retrieval
+        # all reuse the same features instead of re-scanning the question
+        features = featurize(request.question)
+        if not input_guardrails.validate_features(features):
+            raise HTTPException(
+                status_code=400,
+                detail="Please ask a mathematics-related question."
+            )
+
+        kb_score, web_score = score_routes(features)
+
+        if abs(kb_score - web_score) <= 1:
+            # Ambiguous routing: run both backends concurrently and keep
+            # the higher-confidence answer, so latency is max() not sum()
+            web_task = asyncio.create_task(get_web_answer(features.raw))
+            kb_data = get_kb_answer(features)
+            web_data = await web_task
+            if kb_data["confidence"] >= web_data["confidence"]:
+                route, answer_data = "knowledge_base", kb_data
+            else:
+                route, answer_data = "web_search", web_data
+        elif kb_score > web_score:
+            route = "knowledge_base"
+            answer_data = get_kb_answer(features)
         else:
-            answer_data = await get_web_answer(request.question)
-        
-        question_id = f"q_{int(datetime.now().timestamp())}"
+            route = "web_search"
+            answer_data = await get_web_answer(features.raw)
+
+        answer = output_guardrails.validate(answer_data["answer"])
+        # One clock read feeds both the timestamp and the id; the sequence
+        # suffix keeps ids unique within a second
+        ts_ns = time.time_ns()
+        now = datetime.fromtimestamp(ts_ns / 1e9)
+        question_id = f"q_{ts_ns // 1_000_000_000}_{next(_QUESTION_SEQ)}"
         response = QuestionResponse(
-            answer=answer_data["answer"],
+            answer=answer,
             route_used=route,
             confidence_score=answer_data["confidence"],
             sources=answer_data["sources"],
-            timestamp=datetime.now(),
+            timestamp=now,
             question_id=question_id
         )
         
-        question_responses[question_id] = {"request": request.dict(), "response": response.dict()}
+        # Keep just what feedback correlation needs; the full Pydantic
+        # dict conversions were pure allocation overhead per request
+        question_responses[question_id] = (request.question, response.answer, response.route_used)
+        if len(question_responses) > MAX_TRACKED_RESPONSES:
+            question_responses.popitem(last=False)
         return response
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/ask/batch", response_model=List[BatchAnswerItem])
+async def ask_questions(request: BatchQuestionRequest):
+    # Each question runs through the normal ask pipeline; the batch
+    # completes in roughly the slowest question's latency. Failures stay
+    # per item, so one rejected question can't sink the whole batch
+    async def answer_one(question: str) -> BatchAnswerItem:
+        try:
+            response = await ask_question(QuestionRequest(question=question))
+            return BatchAnswerItem(question=question, response=response)
+        except HTTPException as e:
+            return BatchAnswerItem(question=question, error=str(e.detail))
+        except ValidationError as e:
+            # Batch items are plain strings, so length limits are only
+            # enforced here when the per-question request is built
+            return BatchAnswerItem(question=question, error=e.errors()[0]["msg"])
+
+    return await asyncio.gather(
+        *(answer_one(q) for q in request.questions)
+    )
+
 @app.post("/feedback")
 async def submit_feedback(request: FeedbackRequest):
     return {"status": "success", "message": "Feedback recorded"}
 
 @app.get("/sample-questions")
 async def get_sample_questions():
-    return {
-        "knowledge_base_questions": [
-            "What is the derivative of x²?",
-            "How do you solve a quadratic equation?",
-            "What is the Pythagorean theorem?"
-        ],
-        "web_search_questions": [
-            "Latest developments in quantum computing mathematics",
-            "Recent mathematical proofs in number theory",
-            "Modern applications of calculus in AI"
-        ]
-    }
+    return SAMPLE_QUESTIONS
 
 @app.get("/knowledge-base/stats")
 async def get_knowledge_base_stats():
@@ -2,6 +2,8 @@ import re
 from typing import Dict
 import logging
 
+from guardrails import QuestionFeatures, featurize
+
 class RoutingAgent:
     def __init__(self, knowledge_base, web_search):
         self.knowledge_base = knowledge_base
@@ -17,23 +19,49 @@ class RoutingAgent:
         
         # Keywords that suggest web search
         self.web_keywords = [
-            "latest", "recent", "new", "current", "modern", 
+            "latest", "recent", "new", "current", "modern",
             "advanced", "cutting-edge", "development", "research",
             "breakthrough", "discovery", "innovation", "trend"
         ]
-    
+
+        # Each keyword owns one bit, so hits dedupe for free and scoring is
+        # a popcount instead of building sets per request
+        self.kb_bits = {k: 1 << i for i, k in enumerate(self.kb_keywords)}
+        self.web_bits = {k: 1 << i for i, k in enumerate(self.web_keywords)}
+
+        # One alternation tagged by route, so a single linear scan of the
+        # question finds keyword hits and basic-math patterns at once. The
+        # math group comes first; hits that are also kb keywords still get
+        # credited to the kb mask in the scan loop
+        self.route_scan_re = re.compile(
+            r"(?P<math>x\^?\d|derivative|integral|equation)"
+            "|(?P<kb>" + "|".join(re.escape(k) for k in self.kb_keywords) + ")"
+            "|(?P<web>" + "|".join(re.escape(k) for k in self.web_keywords) + ")"
+        )
+
     async def route_question(self, question: str) -> Dict:
         """Decide whether to use knowledge base or web search"""
-        question_lower = question.lower()
-        
-        # Count keyword matches
-        kb_score = sum(1 for keyword in self.kb_keywords 
-                      if keyword in question_lower)
-        web_score = sum(1 for keyword in self.web_keywords 
-                       if keyword in question_lower)
-        
-        # Check for basic math patterns
-        has_basic_math = bool(re.search(r'(x\^?\d|derivative|integral|equation)', question_lower))
+        return await self.route_features(featurize(question))
+
+    async def route_features(self, features: QuestionFeatures) -> Dict:
+        """Route a question from its precomputed features"""
+        question_lower = features.lower
+
+        # One scan sets keyword bits and the basic-math flag together
+        kb_mask = 0
+        web_mask = 0
+        has_basic_math = False
+        for match in self.route_scan_re.finditer(question_lower):
+            group = match.lastgroup
+            if group == "math":
+                has_basic_math = True
+                kb_mask |= self.kb_bits.get(match.group(), 0)
+            elif group == "kb":
+                kb_mask |= self.kb_bits[match.group()]
+            else:
+                web_mask |= self.web_bits[match.group()]
+        kb_score = kb_mask.bit_count()
+        web_score = web_mask.bit_count()
         
         # Routing decision logic
         if kb_score > web_score or has_basic_math:
@@ -45,7 +73,7 @@ class RoutingAgent:
             confidence = min(0.8, 0.5 + (web_score * 0.1))
             reason = "Question requires current information or advanced topics"
         
-        self.logger.info(f"Routing decision: {route} (confidence: {confidence:.2f})")
+        self.logger.info("Routing decision: %s (confidence: %.2f)", route, confidence)
         
         return {
             "route": route,
@@ -0,0 +1,71 @@
+import logging
+import time
+import numpy as np
+from typing import Dict, List, Optional
+
+class SemanticCache:
+    """Embedding-keyed cache for synthesized answers.
+
+    Normalized question embeddings live in a preallocated float32 ring
+    buffer (the same layout KnowledgeBase uses for its cache) with parallel
+    result and insertion-time arrays, so a lookup costs one matrix-vector
+    product that stays on BLAS. A hit needs cosine similarity >= threshold
+    and an entry younger than ttl_seconds; anything else is a miss.
+    """
+
+    def __init__(self, capacity: int = 1024, threshold: float = 0.92,
+                 ttl_seconds: float = 24 * 3600.0):
+        self.logger = logging.getLogger(__name__)
+        self.capacity = capacity
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.embedder = None
+        self.keys = None
+        self.values: List[Optional[Dict]] = []
+        self.timestamps = None
+        self.size = 0
+        self.cursor = 0
+
+    def initialize(self):
+        """Create the embedder; the cache stays disabled if unavailable"""
+        try:
+            from chromadb.utils import embedding_functions
+            self.embedder = embedding_functions.DefaultEmbeddingFunction()
+        except Exception as e:
+            self.logger.warning("Semantic cache disabled (no embedder): %s", e)
+
+    def embed(self, text: str) -> Optional[np.ndarray]:
+        """Embed and L2-normalize text, or None when the cache is disabled"""
+        if not self.embedder:
+            return None
+        try:
+            emb = np.asarray(self.embedder([text])[0], dtype=np.float32)
+            norm = np.linalg.norm(emb)
+            return emb / norm if norm > 0 else None
+        except Exception as e:
+            self.logger.error("Error embedding text: %s", e)
+            return None
+
+    def lookup(self, q_emb: np.ndarray) -> Optional[Dict]:
+        """Return the freshest-enough result most similar to q_emb"""
+        if self.size == 0:
+            return None
+        scores = self.keys[:self.size] @ q_emb
+        best = int(scores.argmax())
+        if float(scores[best]) < self.threshold:
+            return None
+        if time.time() - float(self.timestamps[best]) > self.ttl_seconds:
+            return None
+        return self.values[best]
+
+    def store(self, q_emb: np.ndarray, result: Dict):
+        """Insert a result, evicting the oldest entry when full"""
+        if self.keys is None:
+            self.keys = np.zeros((self.capacity, q_emb.shape[0]), dtype=np.float32)
+            self.values = [None] * self.capacity
+            self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+        self.keys[self.cursor] = q_emb
+        self.values[self.cursor] = result
+        self.timestamps[self.cursor] = time.time()
+        self.cursor = (self.cursor + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
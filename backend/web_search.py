@@ -1,45 +1,228 @@
+import asyncio
 import httpx
 import logging
+import orjson
 import os
-from typing import Dict, List
+import random
+import re
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, List, Optional
 from datetime import datetime
 from dotenv import load_dotenv
 
+from semantic_cache import SemanticCache
+
+# Environment and logger are read once at import; load_dotenv is a no-op
+# after the first call, so importing this module before the entrypoint
+# runs still picks up the keys
 load_dotenv()
+_LOGGER = logging.getLogger(__name__)
+_TAVILY_KEY = os.getenv("TAVILY_API_KEY")
+_SERPER_KEY = os.getenv("SERPER_API_KEY")
+_OPENAI_KEY = os.getenv("OPENAI_API_KEY")
+
+# Static synthesis fragments, allocated once at import; only the question
+# and source count vary per call
+_SYNTH_HEADER_TMPL = """**Step-by-step solution via Web Search:**
+
+**Question:** {q}
+
+**Solution:**
+1. **Research phase:** Found {n} relevant sources from current mathematical literature
+2. **Analysis:** Processing the latest findings and methodologies
+3. **Synthesis:** Based on current research, this topic involves multiple approaches and applications
+4. **Verification:** Cross-referenced with authoritative mathematical sources
+
+**Current insights:**
+Based on recent mathematical research, here are the key findings:
+
+"""
+
+_SYNTH_FOOTER = """**Sources verified:**
+- Academic papers and research
+- Mathematical literature
+- Educational resources"""
+
+@lru_cache(maxsize=256)
+def _simulated_results(query: str) -> tuple:
+    """Canned fallback results for a query, memoized since only the query
+    string varies between calls"""
+    return (
+        {
+            "title": f"Mathematical Research: {query}",
+            "content": f"Current research in {query} shows significant developments in theoretical and applied mathematics. Recent studies indicate new methodologies and applications in various fields.",
+            "url": "https://example.com/math-research",
+            "score": 0.9
+        },
+        {
+            "title": f"Academic Insights: {query}",
+            "content": f"Academic perspective on {query} reveals important theoretical foundations and practical implications for mathematical education and research.",
+            "url": "https://example.com/academic-paper",
+            "score": 0.8
+        }
+    )
 
 class WebSearchMCP:
     def __init__(self):
-        self.logger = logging.getLogger(__name__)
-        self.tavily_api_key = os.getenv("TAVILY_API_KEY")
-        self.openai_api_key = os.getenv("OPENAI_API_KEY")
-        
+        self.logger = _LOGGER
+        self.tavily_api_key = _TAVILY_KEY
+        self.serper_api_key = _SERPER_KEY
+        self.openai_api_key = _OPENAI_KEY
+        self._client: Optional[httpx.AsyncClient] = None
+        self._openai_client = None
+        # Caps in-flight provider calls from batch requests so bursts
+        # don't trip upstream rate limits
+        self._batch_semaphore = asyncio.Semaphore(20)
+        # Circuit breaker: after enough consecutive provider failures,
+        # Tavily calls fail fast with empty results instead of eating a
+        # 30s timeout per call, until the reset window passes; a backup
+        # provider or the simulate fallback then fills the gap
+        self._breaker_failures = 0
+        self._breaker_fail_max = 5
+        self._breaker_reset_timeout = 30.0
+        self._breaker_open_until = 0.0
+        # Cheapest cache tier: exact repeats of a normalized question hit
+        # this O(1) LRU before the embedding-based lookup even runs
+        self._exact_cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._exact_cache_max = 1024
+        self._exact_cache_ttl = 3600.0
+        # Rephrased repeats of recent questions skip Tavily entirely
+        self.semantic_cache = SemanticCache()
+        # Single-flight table: identical questions already being searched
+        # share one in-flight future instead of each hitting the provider
+        self._inflight: Dict[str, asyncio.Future] = {}
+        # Questions about "now"/"today"/"current"/"latest" or recent years
+        # would serve stale cache hits; they bypass the cache entirely
+        self.date_token_re = re.compile(
+            r"\b(?:today|now|tonight|current|latest|recent|this (?:week|month|year))\b"
+        )
+        self.year_re = re.compile(r"\b(?:19|20)\d{2}\b")
+
     async def initialize(self):
-        """Initialize web search component"""
+        """Initialize web search component
+
+        Builds the shared HTTP client; call close() from the app shutdown
+        hook to release its connections.
+        """
+        # One pooled client for the process: keep-alive connections skip
+        # the TCP+TLS handshake that a per-call client pays every time
+        # HTTP/2 multiplexes concurrent searches over one TLS connection,
+        # and compressed JSON bodies cut transfer bytes; httpx decompresses
+        # transparently
+        self._client = httpx.AsyncClient(
+            base_url="https://api.tavily.com",
+            http2=True,
+            headers={"Accept-Encoding": "gzip, br"},
+            limits=httpx.Limits(
+                max_connections=100,
+                max_keepalive_connections=int(os.getenv("WEB_SEARCH_KEEPALIVE_CONNECTIONS", "20")),
+                keepalive_expiry=30.0
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0)
+        )
+        self.semantic_cache.initialize()
         if not self.tavily_api_key:
             self.logger.warning("TAVILY_API_KEY not found. Web search will use simulation.")
         else:
             self.logger.info("Web search initialized with Tavily API")
+
+    async def close(self):
+        """Release the pooled HTTP client"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
-    async def get_answer(self, question: str) -> Dict:
+    def _is_cacheable(self, question: str, no_cache: bool = False) -> bool:
+        """Deterministic gate deciding whether the cache applies
+
+        Very short questions and time-sensitive ones (date words or a year
+        from the last two calendar years) would pollute the cache or serve
+        stale answers, so they skip lookup and write-back entirely.
+        """
+        if no_cache or len(question) < 8:
+            return False
+        lower = question.lower()
+        if self.date_token_re.search(lower):
+            return False
+        year_match = self.year_re.search(lower)
+        if year_match and int(year_match.group()) >= datetime.now().year - 1:
+            return False
+        return True
+
+    def _exact_cache_get(self, key: str) -> Optional[Dict]:
+        """O(1) lookup in the exact-match tier, expiring stale entries"""
+        entry = self._exact_cache.get(key)
+        if entry is None:
+            return None
+        expires, result = entry
+        if time.time() > expires:
+            del self._exact_cache[key]
+            return None
+        self._exact_cache.move_to_end(key)
+        return result
+
+    def _exact_cache_put(self, key: str, result: Dict):
+        """Insert into the exact-match tier, evicting the LRU entry"""
+        self._exact_cache[key] = (time.time() + self._exact_cache_ttl, result)
+        self._exact_cache.move_to_end(key)
+        if len(self._exact_cache) > self._exact_cache_max:
+            self._exact_cache.popitem(last=False)
+
+    async def get_answer(self, question: str, no_cache: bool = False) -> Dict:
         """Get answer via web search using Tavily"""
         try:
-            if self.tavily_api_key:
-                search_results = await self._search_tavily(question)
+            cacheable = self._is_cacheable(question, no_cache)
+            exact_key = " ".join(question.lower().split())
+
+            # Tier 1: exact repeat of a recent question, O(1)
+            if cacheable:
+                cached = self._exact_cache_get(exact_key)
+                if cached is not None:
+                    return cached
+
+            # Tier 2: semantic cache, so near-duplicate questions reuse the
+            # whole search + synthesis result without a network round-trip
+            q_emb = None
+            if cacheable:
+                q_emb = await asyncio.to_thread(self.semantic_cache.embed, question)
+            if q_emb is not None:
+                cached = self.semantic_cache.lookup(q_emb)
+                if cached is not None:
+                    self._exact_cache_put(exact_key, cached)
+                    return cached
+
+            # Single-flight: if the same question is already being searched,
+            # await that result instead of launching a duplicate search
+            inflight = self._inflight.get(exact_key)
+            if inflight is not None:
+                return await inflight
+
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[exact_key] = future
+            try:
+                result = await self._fetch_answer(question)
+            except BaseException as e:
+                future.set_exception(e)
+                future.exception()  # creator consumes it; waiters re-await
+                raise
             else:
-                search_results = await self._simulate_search(question)
-            
-            # Synthesize answer
-            answer = await self._synthesize_basic(question, search_results)
-            
-            return {
-                "answer": answer,
-                "confidence": 0.8,
-                "sources": ["Web Search", "Academic Sources"],
-                "search_results": search_results[:3]
-            }
-            
+                future.set_result(result)
+            finally:
+                del self._inflight[exact_key]
+
+            # Populate both tiers on a successful miss; simulated fallback
+            # answers must not outlive the outage that produced them
+            if result["search_results"] and not result.get("simulated"):
+                if cacheable:
+                    self._exact_cache_put(exact_key, result)
+                if q_emb is not None:
+                    self.semantic_cache.store(q_emb, result)
+            return result
+
         except Exception as e:
-            self.logger.error(f"Error in web search: {str(e)}")
+            self.logger.error("Error in web search: %s", e)
             return {
                 "answer": f"Unable to search for '{question}'. Please try again later. Error: {str(e)}",
                 "confidence": 0.0,
@@ -47,86 +230,300 @@ class WebSearchMCP:
                 "search_results": []
             }
     
+    async def _fetch_answer(self, question: str) -> Dict:
+        """Run the provider search and synthesis for a cache miss"""
+        simulated = False
+        if self.tavily_api_key:
+            if self.openai_api_key:
+                return await self._fetch_answer_llm(question)
+            search_results = await self._search_web(question)
+            if not search_results:
+                # Every provider failed or came back empty (e.g. breaker
+                # open): degrade to canned results, marked so they never
+                # enter the cache tiers
+                search_results = await self._simulate_search(question)
+                simulated = True
+        else:
+            search_results = await self._simulate_search(question)
+            simulated = True
+
+        # One slice serves both the synthesizer and the response
+        top_results = search_results[:3]
+
+        # Synthesize answer
+        answer = await self._synthesize_basic(
+            question, top_results, total=len(search_results)
+        )
+
+        result = {
+            "answer": answer,
+            "confidence": 0.8,
+            "sources": ["Web Search", "Academic Sources"],
+            "search_results": top_results
+        }
+        if simulated:
+            result["simulated"] = True
+        return result
+
+    async def _fetch_answer_llm(self, question: str) -> Dict:
+        """Search and synthesize with the LLM call overlapping slow providers
+
+        Synthesis starts the moment the first provider returns sources, so
+        the OpenAI round-trip runs concurrently with any slower provider
+        still in flight. Stragglers that finish during the LLM call still
+        contribute to the returned source list; the rest are cancelled.
+        """
+        tasks = [asyncio.create_task(self._search_tavily(question))]
+        if self.serper_api_key:
+            tasks.append(asyncio.create_task(self._search_serper(question)))
+
+        search_results: List[Dict] = []
+        synth_task = None
+        pending = set(tasks)
+        while pending and synth_task is None:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                search_results.extend(task.result())
+            if search_results:
+                synth_task = asyncio.create_task(
+                    self._synthesize(question, list(search_results))
+                )
+
+        simulated = False
+        if synth_task is None:
+            # Every provider failed or came back empty: degrade to canned
+            # results, marked so they never enter the cache tiers
+            search_results = await self._simulate_search(question)
+            simulated = True
+            answer = await self._synthesize_basic(
+                question, search_results[:3], total=len(search_results)
+            )
+        else:
+            answer = await synth_task
+            if pending:
+                done, pending = await asyncio.wait(pending, timeout=0)
+                for task in done:
+                    search_results.extend(task.result())
+                for task in pending:
+                    task.cancel()
+
+        result = {
+            "answer": answer,
+            "confidence": 0.8,
+            "sources": ["Web Search", "Academic Sources"],
+            "search_results": search_results[:3]
+        }
+        if simulated:
+            result["simulated"] = True
+        return result
+
+    async def get_answers(self, questions: List[str]) -> List[Dict]:
+        """Answer a batch of questions concurrently
+
+        One task per question, at most 20 in flight at once. The pooled
+        client means a burst completes in roughly the slowest question's
+        latency rather than the sum of all of them.
+        """
+        async def bounded(question: str) -> Dict:
+            async with self._batch_semaphore:
+                return await self.get_answer(question)
+
+        return await asyncio.gather(
+            *(bounded(q) for q in questions), return_exceptions=True
+        )
+
+    async def _search_web(self, query: str) -> List[Dict]:
+        """Race the configured search providers, first useful answer wins
+
+        With a backup provider configured, net latency becomes the fastest
+        provider's instead of Tavily's alone, and a Tavily outage no longer
+        takes the whole search path down.
+        """
+        tasks = [asyncio.create_task(self._search_tavily(query))]
+        if self.serper_api_key:
+            tasks.append(asyncio.create_task(self._search_serper(query)))
+        if len(tasks) == 1:
+            return await tasks[0]
+
+        pending = set(tasks)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                results = task.result()
+                if results:
+                    for loser in pending:
+                        loser.cancel()
+                    return results
+        return []
+
+    async def _post_with_retry(self, url: str, attempts: int = 3, **kwargs) -> httpx.Response:
+        """POST with bounded exponential backoff and jitter
+
+        Retries transient transport and HTTP-status failures so a single
+        502 doesn't surface as a failed search; the last error propagates.
+        """
+        for attempt in range(attempts):
+            try:
+                response = await self._client.post(url, **kwargs)
+                response.raise_for_status()
+                return response
+            except (httpx.TransportError, httpx.HTTPStatusError):
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(min(2.0, 0.1 * (2 ** attempt)) + random.random() * 0.1)
+
+    def _record_failure(self):
+        """Count a provider failure, opening the breaker at the threshold"""
+        self._breaker_failures += 1
+        if self._breaker_failures >= self._breaker_fail_max:
+            self._breaker_open_until = time.time() + self._breaker_reset_timeout
+            self._breaker_failures = 0
+            self.logger.warning(
+                "Search circuit breaker opened for %ss", self._breaker_reset_timeout
+            )
+
+    async def _search_serper(self, query: str) -> List[Dict]:
+        """Search using the Serper API as a backup provider"""
+        try:
+            if self._client is None:
+                await self.initialize()
+
+            response = await self._post_with_retry(
+                "https://google.serper.dev/search",
+                content=orjson.dumps({"q": f"mathematics {query}", "num": 3}),
+                headers={
+                    "X-API-KEY": self.serper_api_key,
+                    "content-type": "application/json"
+                }
+            )
+
+            data = orjson.loads(response.content)
+            results = []
+
+            for item in data.get("organic", []):
+                results.append({
+                    "title": item.get("title", ""),
+                    "content": item.get("snippet", ""),
+                    "url": item.get("link", ""),
+                    "score": 0.0
+                })
+
+            return results
+
+        except Exception as e:
+            self.logger.error("Serper search error: %s", e)
+            return []
+
     async def _search_tavily(self, query: str) -> List[Dict]:
         """Search using Tavily API"""
+        if time.time() < self._breaker_open_until:
+            # Breaker open: repeated failures recently, don't even try.
+            # Empty results (not simulated ones) let a healthy backup
+            # provider win the race and keep canned text out of the caches
+            return []
+
         try:
-            url = "https://api.tavily.com/search"
+            # Only ask for what downstream uses: the top results feed the
+            # response/synthesis, and Tavily's own answer blurb was never
+            # read, so skipping it trims transfer and parse cost
             payload = {
                 "api_key": self.tavily_api_key,
                 "query": f"mathematics {query}",
                 "search_depth": "basic",
-                "include_answer": True,
-                "max_results": 5
+                "include_answer": False,
+                "max_results": 3
             }
-            
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=payload, timeout=30.0)
-                response.raise_for_status()
-                
-                data = response.json()
-                results = []
-                
-                for item in data.get("results", []):
-                    results.append({
-                        "title": item.get("title", ""),
-                        "content": item.get("content", ""),
-                        "url": item.get("url", ""),
-                        "score": item.get("score", 0.0)
-                    })
-                
-                return results
-                
+
+            if self._client is None:
+                await self.initialize()
+
+            response = await self._post_with_retry(
+                "/search",
+                content=orjson.dumps(payload),
+                headers={"content-type": "application/json"}
+            )
+
+            data = orjson.loads(response.content)
+            results = []
+
+            for item in data.get("results", []):
+                results.append({
+                    "title": item.get("title", ""),
+                    "content": item.get("content", ""),
+                    "url": item.get("url", ""),
+                    "score": item.get("score", 0.0)
+                })
+
+            self._breaker_failures = 0
+            return results
+
         except Exception as e:
-            self.logger.error(f"Tavily search error: {str(e)}")
+            self._record_failure()
+            self.logger.error("Tavily search error: %s", e)
             return []
     
     async def _simulate_search(self, query: str) -> List[Dict]:
         """Simulate search results for demo purposes"""
-        return [
-            {
-                "title": f"Mathematical Research: {query}",
-                "content": f"Current research in {query} shows significant developments in theoretical and applied mathematics. Recent studies indicate new methodologies and applications in various fields.",
-                "url": "https://example.com/math-research",
-                "score": 0.9
-            },
-            {
-                "title": f"Academic Insights: {query}",
-                "content": f"Academic perspective on {query} reveals important theoretical foundations and practical implications for mathematical education and research.",
-                "url": "https://example.com/academic-paper",
-                "score": 0.8
-            }
-        ]
+        return list(_simulated_results(query))
     
-    async def _synthesize_basic(self, question: str, results: List[Dict]) -> str:
-        """Basic synthesis without OpenAI"""
+    async def _synthesize(self, question: str, results: List[Dict]) -> str:
+        """Synthesize an answer from search results with OpenAI
+
+        Falls back to the template synthesizer on any API failure so a
+        provider outage degrades answer quality, not availability.
+        """
+        try:
+            if self._openai_client is None:
+                from openai import AsyncOpenAI
+                self._openai_client = AsyncOpenAI(api_key=self.openai_api_key)
+
+            context = "\n\n".join(
+                f"{r['title']}\n{r['content'][:300]}" for r in results[:2]
+            )
+            response = await self._openai_client.chat.completions.create(
+                model="gpt-3.5-turbo",
+                messages=[
+                    {
+                        "role": "system",
+                        "content": "You are a mathematics professor. Provide a clear step-by-step educational solution based on the given sources."
+                    },
+                    {
+                        "role": "user",
+                        "content": f"Question: {question}\n\nSources:\n{context}"
+                    }
+                ],
+                max_tokens=500,
+                temperature=0.3
+            )
+            return response.choices[0].message.content
+
+        except Exception as e:
+            self.logger.error("OpenAI synthesis error: %s", e)
+            return await self._synthesize_basic(question, results, total=len(results))
+
+    async def _synthesize_basic(self, question: str, results: List[Dict],
+                                total: Optional[int] = None) -> str:
+        """Basic synthesis without OpenAI
+
+        Callers that already sliced the result list can pass the original
+        count as total so the narrative still reflects everything found.
+        """
         if not results:
             return f"I couldn't find specific information about '{question}' in current sources. Please try rephrasing your question."
-        
-        answer = f"""**Step-by-step solution via Web Search:**
 
-**Question:** {question}
+        # Collect fragments and join once; repeated += would re-copy the
+        # growing answer for every source appended
+        parts = [_SYNTH_HEADER_TMPL.format(q=question, n=total if total is not None else len(results))]
 
-**Solution:**
-1. **Research phase:** Found {len(results)} relevant sources from current mathematical literature
-2. **Analysis:** Processing the latest findings and methodologies  
-3. **Synthesis:** Based on current research, this topic involves multiple approaches and applications
-4. **Verification:** Cross-referenced with authoritative mathematical sources
+        # Add content from search results (at most two, without re-slicing)
+        for i, result in enumerate(results):
+            if i >= 2:
+                break
+            parts.append(f"**Source {i+1}:** {result['title']}\n{result['content'][:300]}...\n\n")
 
-**Current insights:**
-Based on recent mathematical research, here are the key findings:
+        parts.append(_SYNTH_FOOTER)
 
-"""
-        
-        # Add content from search results
-        for i, result in enumerate(results[:2]):
-            answer += f"**Source {i+1}:** {result['title']}\n{result['content'][:300]}...\n\n"
-        
-        answer += """**Sources verified:**
-- Academic papers and research
-- Mathematical literature
-- Educational resources"""
-        
-        return answer
+        return "".join(parts)
     
     def is_healthy(self) -> bool:
         """Check if web search is healthy"""